@@ -1,19 +1,15 @@
 import os
-import json
+import hashlib
+import tempfile
+import threading
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
-import requests
-
-from google_helpers import (
-    get_google_creds,
-    list_events,
-    copy_template,
-    fill_slides_placeholders,
-    get_web_view_link,
-    attendees_to_company,
-)
+import orjson
+
+# openai, requests and google_helpers (googleapiclient) are imported lazily
+# where they're used, so the first paint doesn't wait on them.
 
 # ---------------------------
 # Env & constants
@@ -42,7 +38,7 @@ DEFAULT_RESOURCES = [
 ]
 
 try:
-    RESOURCES = json.loads(RESOURCES_JSON) if RESOURCES_JSON else DEFAULT_RESOURCES
+    RESOURCES = orjson.loads(RESOURCES_JSON) if RESOURCES_JSON else DEFAULT_RESOURCES
     # Ensure exactly 6 items (trim or pad if needed)
     if len(RESOURCES) < 7:
         RESOURCES = RESOURCES + DEFAULT_RESOURCES[: 7 - len(RESOURCES)]
@@ -74,25 +70,112 @@ if "summaries" not in st.session_state:
     st.session_state["summaries"] = {}   # { event_id: summary_text }
 if "current_event_id" not in st.session_state:
     st.session_state["current_event_id"] = None
+if "slack_futures" not in st.session_state:
+    st.session_state["slack_futures"] = []   # in-flight Slack posts from earlier reruns
+
+# ---------------------------
+# Background pool for Slack posts (survives reruns)
+# ---------------------------
+@st.cache_resource
+def _slack_pool():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="slack")
+
+_SLACK_POOL = _slack_pool()
+
+# Report on Slack posts that finished since the last rerun
+pending = []
+for fut in st.session_state["slack_futures"]:
+    if not fut.done():
+        pending.append(fut)
+    elif fut.exception() is not None:
+        st.warning(f"Could not send to Slack (check webhook URL/permissions): {fut.exception()}")
+    else:
+        st.info("Sent to Slack ✅")
+st.session_state["slack_futures"] = pending
 
 # ---------------------------
 # Helpers
 # ---------------------------
+@st.cache_resource
+def _cached_google_creds(client_json_path):
+    from google_helpers import get_google_creds
+    return get_google_creds(client_json_path)
+
+
+@st.cache_resource
+def _google_creds_lock():
+    # cache_resource, not a module global: app.py re-executes on every rerun
+    return threading.Lock()
+
+
+def google_creds():
+    """
+    Process-wide Google credentials (shared by all sessions); refreshed in
+    place under a lock when the token expires.
+    """
+    creds = _cached_google_creds(GOOGLE_OAUTH_CLIENT_JSON)
+    if creds is None:
+        _cached_google_creds.clear()  # don't pin a failed load
+        raise RuntimeError("Google credentials not configured (set GOOGLE_TOKEN_JSON)")
+    if creds.expired and creds.refresh_token:
+        with _google_creds_lock():
+            if creds.expired:  # another session may have refreshed it meanwhile
+                from google.auth.transport.requests import Request
+                try:
+                    creds.refresh(Request())
+                except Exception:
+                    _cached_google_creds.clear()  # e.g. revoked token; reload next time
+                    raise
+    return creds
+
+
+# Slack limits: 3000 chars per section text, 2000 per field, 150 per header
+SLACK_SECTION_MAX = 2900
+SLACK_FIELD_MAX = 1900
+SLACK_HEADER_MAX = 150
+SLACK_PAYLOAD_MAX = 40000  # bytes; Slack rejects much larger bodies outright
+
+
+def _truncate(text, limit):
+    """Cut text to at most limit chars, marking the cut with an ellipsis."""
+    text = text or ""
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _send_slack_blocks(slack_webhook, payload):
+    """POST a pre-serialized blocks payload to the webhook; raises on HTTP errors (runs on the Slack pool)."""
+    import requests
+    r = requests.post(
+        slack_webhook,
+        data=payload,
+        headers={"Content-Type": "application/json"},
+        timeout=10,
+    )
+    r.raise_for_status()
+    return True
+
+
 def post_to_slack_if_enabled(summary, link, company_name, event_title, event_time, poc_emails, resources_text, slack_webhook):
     """
-    Returns True if a Slack message was sent, False otherwise.
+    Queue a Slack message on the background pool and return its Future, or None if not sent.
     Respects the sidebar toggle; never sends if toggle is OFF or webhook missing.
     """
     if not st.session_state.get("auto_slack"):
-        return False  # toggle OFF
+        return None  # toggle OFF
     if not slack_webhook:
-        return False  # no webhook configured
+        return None  # no webhook configured
+
+    # Pre-truncate to Slack's per-block limits so the post isn't rejected with a 400
+    summary = _truncate(summary, SLACK_SECTION_MAX)
+    resources_text = _truncate(resources_text, SLACK_SECTION_MAX)
+    event_title = _truncate(event_title, SLACK_FIELD_MAX)
+    poc_emails = _truncate(poc_emails, SLACK_FIELD_MAX)
 
     # Add the resources as a single mrkdwn block (simple bullets)
     resources_block = {"type": "section", "text": {"type": "mrkdwn", "text": resources_text}} if resources_text else None
 
     blocks = [
-        {"type": "header", "text": {"type": "plain_text", "text": f"POC Slides Brief — {company_name}", "emoji": True}},
+        {"type": "header", "text": {"type": "plain_text", "text": _truncate(f"POC Slides Brief — {company_name}", SLACK_HEADER_MAX), "emoji": True}},
         {
             "type": "section",
             "fields": [
@@ -113,56 +196,80 @@ def post_to_slack_if_enabled(summary, link, company_name, event_title, event_tim
         # Insert resources above the actions row so the button stays at the bottom
         blocks.insert(3, resources_block)
 
-    try:
-        r = requests.post(slack_webhook, json={"blocks": blocks}, timeout=10)
-        r.raise_for_status()
-        return True
-    except Exception:
-        return False
-
+    payload = orjson.dumps({"blocks": blocks})
+    if len(payload) > SLACK_PAYLOAD_MAX:
+        raise ValueError(f"Slack payload too large ({len(payload)} bytes)")
+    return _SLACK_POOL.submit(_send_slack_blocks, slack_webhook, payload)
 
-def collect_event_emails(e):
-    """Collect attendee + organizer + creator emails; return list of lower-cased emails (deduped)."""
-    emails = []
 
+def _iter_event_emails(e):
+    """Yield lower-cased attendee + organizer + creator emails (may repeat)."""
     # Attendees (dict or str)
     for a in (e.get("attendees") or []):
-        if isinstance(a, dict):
-            em = (a.get("email") or "").strip().lower()
+        if type(a) is dict:
+            em = a.get("email")
+        elif type(a) is str:
+            em = a
+        else:
+            continue
+        if em:
+            em = em.strip().lower()
             if em:
-                emails.append(em)
-        elif isinstance(a, str):
-            emails.append(a.strip().lower())
+                yield em
 
     # Organizer / Creator
     for key in ("organizer", "creator"):
-        info = e.get(key) or {}
-        em = (info.get("email") or "").strip().lower()
+        em = ((e.get(key) or {}).get("email") or "").strip().lower()
         if em:
-            emails.append(em)
+            yield em
+
 
-    # Deduplicate keep order
-    out = []
-    seen = set()
-    for em in emails:
-        if em not in seen:
-            seen.add(em)
-            out.append(em)
-    return out
+def collect_event_emails(e):
+    """Collect attendee + organizer + creator emails; return tuple of lower-cased emails (deduped)."""
+    # dict.fromkeys dedupes while keeping order
+    return tuple(dict.fromkeys(_iter_event_emails(e)))
 
 
-def exclude_event_by_domain(all_emails, excluded_domain, mode="any"):
+def event_to_row(e):
     """
-    Return True if the event should be excluded based on domain.
-    mode='any'  -> exclude if ANY email ends with @excluded_domain
-    mode='all'  -> exclude if ALL emails (and at least one exists) end with @excluded_domain
+    Build the table row for an event in a single pass over its emails,
+    or return None if the event is excluded by domain:
+    EXCLUSION_MODE='any' -> exclude if ANY email ends with @EXCLUDED_DOMAIN
+    EXCLUSION_MODE='all' -> exclude if ALL emails (and at least one exists) do
     """
-    if not excluded_domain or not all_emails:
-        return False
-    suffix = "@" + excluded_domain
-    if mode == "all":
-        return all(em.endswith(suffix) for em in all_emails)
-    return any(em.endswith(suffix) for em in all_emails)
+    check_any = bool(EXCLUDED_DOMAIN) and EXCLUSION_MODE != "all"
+    check_all = bool(EXCLUDED_DOMAIN) and EXCLUSION_MODE == "all"
+    all_internal = True
+    seen = {}
+    for em in _iter_event_emails(e):
+        # Compare the part after the last "@" rather than scanning for a suffix
+        if em.rpartition("@")[2] == EXCLUDED_DOMAIN:
+            if check_any:
+                return None  # short-circuit before building anything else
+        else:
+            all_internal = False
+        seen[em] = None
+    if check_all and seen and all_internal:
+        return None
+
+    from google_helpers import attendees_to_company
+
+    emails = tuple(seen)
+    start_info = e.get("start") or {}
+    return {
+        "id": e.get("id", ""),
+        "summary": e.get("summary", ""),
+        "start": start_info.get("dateTime") or start_info.get("date") or "",
+        "attendees": ", ".join(emails),
+        # Computed once here so the selection/Generate handlers don't redo them
+        "_emails": emails,
+        "_company": attendees_to_company(
+            e.get("attendees", []),
+            event_summary=e.get("summary", ""),
+            event_description=e.get("description", ""),
+        ),
+        "_raw": e
+    }
 
 
 def format_resources_text(selected_resources):
@@ -176,16 +283,68 @@ def format_resources_text(selected_resources):
     return "\n".join(lines)
 
 
-def build_event_summary(event_row: dict, company: dict, resources_text: str = "") -> str:
-    """Call OpenAI to summarize the event/company. Returns summary text."""
+@st.cache_resource
+def _openai_client():
+    """One OpenAI client (and its connection pool) shared across summaries and reruns."""
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+@st.cache_resource
+def _summary_cache_dir() -> str:
+    """Where we persist generated summaries (survives reruns and restarts); created once."""
+    path = os.path.join(".cache", "summaries")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _summary_cache_path(key: str) -> str:
+    return os.path.join(_summary_cache_dir(), f"{key}.txt")
+
+
+def _write_summary_cache(cache_path: str, summary: str) -> None:
+    """Write via a temp file + os.replace so a crash or a concurrent writer never leaves a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(summary)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+STREAM_REPAINT_EVERY = 20  # deltas between placeholder updates while streaming
+
+
+def build_event_summary(event_row: dict, company: dict, resources_text: str = "", placeholder=None) -> str:
+    """
+    Call OpenAI to summarize the event/company. Returns summary text (cached on disk by inputs).
+    If placeholder (an st.empty()) is given, the response is streamed into it as it arrives.
+    """
     if not OPENAI_API_KEY:
         return ""
-    client = OpenAI(api_key=OPENAI_API_KEY)
 
     # Inputs
     event_title = event_row.get("summary", "")
     event_time  = event_row.get("start", "")
-    poc_emails  = ", ".join(collect_event_emails(event_row.get("_raw", {})))
+    poc_emails  = ", ".join(event_row.get("_emails") or collect_event_emails(event_row.get("_raw", {})))
+
+    inputs = {
+        "event_title": event_title,
+        "event_time": event_time,
+        "poc_emails": poc_emails,
+        "company_name": company.get("companyName", ""),
+        "company_domain": company.get("companyDomain", ""),
+        "resources_text": resources_text,
+    }
+    key = hashlib.sha256(orjson.dumps(inputs, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    cache_path = _summary_cache_path(key)
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return f.read()
+
+    client = _openai_client()
 
     prompt = f"""
 You are assisting with **Prospect Discovery** research, using the framework defined in this project:
@@ -210,8 +369,20 @@ Resources:
             {"role": "user", "content": prompt},
         ],
         temperature=0.4,
+        stream=True,
     )
-    return (res.choices[0].message.content or "").strip()
+    chunks = []
+    for ev in res:
+        if not ev.choices or not ev.choices[0].delta.content:
+            continue
+        chunks.append(ev.choices[0].delta.content)
+        # Repaint every few deltas, not per token, to keep websocket traffic down
+        if placeholder is not None and len(chunks) % STREAM_REPAINT_EVERY == 0:
+            placeholder.markdown("".join(chunks))
+    summary = "".join(chunks).strip()
+    if summary:
+        _write_summary_cache(cache_path, summary)
+    return summary
 
 # ---------------------------
 # Inputs
@@ -229,7 +400,8 @@ with col3:
 # ---------------------------
 if st.button("Load events"):
     try:
-        creds = get_google_creds(GOOGLE_OAUTH_CLIENT_JSON)
+        from google_helpers import list_events
+        creds = google_creds()
         events = list_events(
             creds,
             calendar_id="primary" if GOOGLE_CALENDAR_ID in ("me", "primary", "") else GOOGLE_CALENDAR_ID,
@@ -240,18 +412,9 @@ if st.button("Load events"):
 
         rows = []
         for e in events:
-            all_emails = collect_event_emails(e)
-            # Apply domain exclusion per config
-            if exclude_event_by_domain(all_emails, EXCLUDED_DOMAIN, mode=EXCLUSION_MODE):
-                continue
-
-            rows.append({
-                "id": e.get("id", ""),
-                "summary": e.get("summary", ""),
-                "start": e.get("start", {}).get("dateTime") or e.get("start", {}).get("date") or "",
-                "attendees": ", ".join(all_emails),
-                "_raw": e
-            })
+            row = event_to_row(e)
+            if row is not None:
+                rows.append(row)
 
         st.session_state["rows"] = rows
         st.success(f"Loaded {len(rows)} event(s).")
@@ -262,7 +425,9 @@ if st.button("Load events"):
 # Show table regardless (empty if not loaded yet)
 rows = st.session_state.get("rows", [])
 st.subheader("Events")
-st.dataframe(rows, use_container_width=True)
+# Only ship display columns to the browser; _raw/_emails/_company stay server-side
+DISPLAY_COLUMNS = ("id", "summary", "start", "attendees")
+st.dataframe([{k: r[k] for k in DISPLAY_COLUMNS} for r in rows], use_container_width=True)
 
 # Row select (only matters if rows exist)
 idx = st.number_input(
@@ -306,33 +471,26 @@ if rows:
     if event_id and event_id != st.session_state["current_event_id"]:
         st.session_state["current_event_id"] = event_id
 
-        # Compute company for this event
-        raw_event = selected_row["_raw"]
-        company_for_cache = attendees_to_company(
-            raw_event.get("attendees", []),
-            event_summary=raw_event.get("summary", ""),
-            event_description=raw_event.get("description", ""),
-        )
+        company_for_cache = selected_row["_company"]
 
         # If not already cached, generate and cache
         if event_id not in st.session_state["summaries"]:
+            stream_box = st.empty()
             with st.spinner("Generating AI summary for this event..."):
                 try:
-                    summary_text = build_event_summary(selected_row, company_for_cache, resources_text_for_cache)
+                    summary_text = build_event_summary(
+                        selected_row, company_for_cache, resources_text_for_cache, placeholder=stream_box
+                    )
                 except Exception as ex:
                     summary_text = f"(Summary error: {ex})"
                 st.session_state["summaries"][event_id] = summary_text
+            stream_box.empty()  # final text is shown in the summary box below
 
 # ---------------------------
 # Step 3: generate Slides + send Slack with selected resources
 # ---------------------------
 if rows:
-    selected = rows[idx]["_raw"]
-    company = attendees_to_company(
-        selected.get("attendees", []),
-        event_summary=selected.get("summary", ""),
-        event_description=selected.get("description", ""),
-    )
+    company = rows[idx]["_company"]
     label = f"{company['companyName']}" + (f" ({company['companyDomain']})" if company.get("companyDomain") else "")
     st.write(f"**Company guest:** {label}")
 
@@ -347,10 +505,11 @@ if rows:
             st.error("Missing GSLIDES_TEMPLATE_ID in .env")
         else:
             try:
-                creds = get_google_creds(GOOGLE_OAUTH_CLIENT_JSON)
+                from google_helpers import copy_template, fill_slides_placeholders
+                creds = google_creds()
 
                 name = f"{company['companyName']} - POC Brief ({rows[idx]['start']})"
-                file_id = copy_template(creds, GSLIDES_TEMPLATE_ID, name)
+                file_id, link = copy_template(creds, GSLIDES_TEMPLATE_ID, name)
 
                 # Build resources text for Slides and Slack
                 resources_text = format_resources_text(selected_resources)
@@ -358,13 +517,12 @@ if rows:
                 # Replace placeholders in Slides (add {{Resources}} to your template)
                 replacements = {
                     "{{CompanyName}}": company['companyName'],
-                    "{{POCEmails}}": ", ".join(collect_event_emails(selected)),
+                    "{{POCEmails}}": ", ".join(rows[idx]["_emails"]),
                     "{{EventTitle}}": rows[idx]['summary'],
                     "{{EventTime}}": rows[idx]['start'],
                     "{{Resources}}": resources_text or "—",
                 }
                 fill_slides_placeholders(creds, file_id, replacements)
-                link = get_web_view_link(creds, file_id)
 
                 # Use cached summary if available; (optional) regenerate to include link
                 event_id = rows[idx]["id"]
@@ -378,7 +536,7 @@ if rows:
                 st.text_area("Summary (final)", summary, height=180)
 
                 # Slack (single, centralized call that respects toggle)
-                sent = post_to_slack_if_enabled(
+                future = post_to_slack_if_enabled(
                     summary=summary,
                     link=link,
                     company_name=company["companyName"],
@@ -388,11 +546,10 @@ if rows:
                     resources_text=resources_text,
                     slack_webhook=SLACK_WEBHOOK_URL
                 )
-                if sent:
-                    st.info("Sent to Slack ✅")
-                else:
-                    if st.session_state.get("auto_slack") and SLACK_WEBHOOK_URL:
-                        st.warning("Could not send to Slack (check webhook URL/permissions).")
+                if future is not None:
+                    # Result is reported on the next rerun once the post completes
+                    st.session_state["slack_futures"].append(future)
+                    st.info("Sending to Slack…")
 
             except Exception as ex:
                 st.error(f"Error generating slides brief: {ex}")
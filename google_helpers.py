@@ -5,13 +5,15 @@ import os
 import json
 import re
 import datetime as dt
-from collections import Counter
-from typing import List, Dict, Optional
+import functools
+import weakref
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
 
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+
+# googleapiclient / google_auth_oauthlib are heavy; they're imported where used
 
 # ---------------------------------------------------------------------
 # OAuth / Scopes
@@ -53,6 +55,37 @@ def get_google_creds(client_json_path: str) -> Credentials:
 # Google APIs: Calendar / Drive / Slides
 # ---------------------------------------------------------------------
 
+# Service clients are memoized per credentials object so build() doesn't reload
+# and re-parse the bundled (static) discovery doc on every call; it makes no
+# network fetch either way. A cached service holds its creds alive, so id(creds)
+# can't be reused while its entry is still in the LRU.
+#
+# The service's own httplib2 connection isn't thread-safe and the cache is
+# shared across Streamlit sessions, so every execute() gets a fresh one (_http).
+_CREDS: "weakref.WeakValueDictionary[int, Credentials]" = weakref.WeakValueDictionary()
+
+@functools.lru_cache(maxsize=16)
+def _cached_service(api: str, version: str, creds_id: int):
+    from googleapiclient.discovery import build
+    return build(
+        api, version,
+        credentials=_CREDS[creds_id],
+        cache_discovery=False,
+        static_discovery=True,
+    )
+
+def _svc(api: str, version: str, creds: Credentials):
+    """Return a (cached) Google API service client for these credentials."""
+    _CREDS[id(creds)] = creds
+    return _cached_service(api, version, id(creds))
+
+def _http(creds: Credentials):
+    """A private authorized HTTP connection for one call's requests."""
+    # build_http() is what build() uses: 60s default timeout, 308 not followed
+    import google_auth_httplib2
+    from googleapiclient.http import build_http
+    return google_auth_httplib2.AuthorizedHttp(creds, http=build_http())
+
 def list_events(
     creds: Credentials,
     calendar_id: str,
@@ -61,22 +94,36 @@ def list_events(
     end_iso: str,
 ) -> List[Dict]:
     """List events between start_iso and end_iso, filtered by q."""
-    service = build("calendar", "v3", credentials=creds)
-    events_result = service.events().list(
+    service = _svc("calendar", "v3", creds)
+    events = service.events()
+    items: List[Dict] = []
+    request = events.list(
         calendarId=calendar_id,
         q=q,
         timeMin=start_iso,
         timeMax=end_iso,
         singleEvents=True,
         orderBy="startTime",
-    ).execute()
-    return events_result.get("items", [])
+        maxResults=2500,
+        # Only the fields the app reads; keeps responses small
+        fields="nextPageToken,items(id,summary,description,start,attendees(email),organizer(email),creator(email))",
+    )
+    http = _http(creds)
+    while request is not None:
+        resp = request.execute(http=http)
+        items.extend(resp.get("items", []))
+        request = events.list_next(request, resp)
+    return items
 
-def copy_template(creds: Credentials, template_id: str, new_name: str) -> str:
-    """Copy a Drive file (Slides template) and return the new file ID."""
-    drive = build("drive", "v3", credentials=creds)
-    copied = drive.files().copy(fileId=template_id, body={"name": new_name}).execute()
-    return copied["id"]
+def copy_template(creds: Credentials, template_id: str, new_name: str) -> Tuple[str, str]:
+    """Copy a Drive file (Slides template) and return (new file ID, webViewLink)."""
+    drive = _svc("drive", "v3", creds)
+    copied = drive.files().copy(
+        fileId=template_id,
+        body={"name": new_name},
+        fields="id,webViewLink",
+    ).execute(http=_http(creds))
+    return copied["id"], copied.get("webViewLink", "")
 
 def fill_slides_placeholders(creds: Credentials, presentation_id: str, replacements: Dict[str, str]) -> None:
     """
@@ -89,9 +136,10 @@ def fill_slides_placeholders(creds: Credentials, presentation_id: str, replaceme
         "{{EventTime}}": "2025-08-12T10:00:00-05:00"
       }
     """
-    slides = build("slides", "v1", credentials=creds)
+    slides = _svc("slides", "v1", creds)
     requests = []
-    for token, value in replacements.items():
+    # Longest tokens first so a token nested inside another isn't replaced early
+    for token, value in sorted(replacements.items(), key=lambda kv: len(kv[0]), reverse=True):
         requests.append({
             "replaceAllText": {
                 "containsText": {"text": token, "matchCase": True},
@@ -101,108 +149,128 @@ def fill_slides_placeholders(creds: Credentials, presentation_id: str, replaceme
     slides.presentations().batchUpdate(
         presentationId=presentation_id,
         body={"requests": requests}
-    ).execute()
-
-def get_web_view_link(creds: Credentials, file_id: str) -> str:
-    """Return Drive webViewLink for a file."""
-    drive = build("drive", "v3", credentials=creds)
-    meta = drive.files().get(fileId=file_id, fields="webViewLink").execute()
-    return meta.get("webViewLink", "")
+    ).execute(http=_http(creds))
 
 # ---------------------------------------------------------------------
 # Company detection
 # ---------------------------------------------------------------------
 
-def attendees_to_company(attendees, event_summary: Optional[str] = None, event_description: Optional[str] = None) -> Dict[str, str]:
-    """
-    Guess the company from attendee emails and optional event text.
-    Returns: {"companyName": str, "companyDomain": str}
+# Memoized: the same handful of domains recur across every event in a load
+@functools.lru_cache(maxsize=1024)
+def _base_domain(d: str) -> str:
+    d = (d or "").lower().strip().replace("@", "")
+    if d.startswith("www."):
+        d = d[4:]
+    parts = d.split(".")
+    if len(parts) >= 3:
+        # heuristic: keep last two labels (works for most corporate domains)
+        d = ".".join(parts[-2:])
+    return d
+
+@functools.lru_cache(maxsize=1024)
+def _pretty_from_domain(d: str) -> str:
+    core = _base_domain(d).split(".")[0]
+    return core.capitalize() if core else "Unknown"
 
+def _env_domains(name: str, default: str = "") -> List[str]:
+    return [d.strip().lower() for d in os.getenv(name, default).split(",") if d.strip()]
+
+# Company-detection config, parsed once (see reload_company_config)
+_INTERNAL: frozenset = frozenset()
+_IGNORE: frozenset = frozenset()
+_PRIORITY: Tuple[str, ...] = ()
+_NAME_MAP: Mapping[str, str] = MappingProxyType({})
+
+def reload_company_config() -> None:
+    """
+    (Re)read company-detection config from the environment.
     Config via .env (all optional; comma-separated for lists):
       INTERNAL_DOMAINS  - domains to ignore as "personal/internal"
       IGNORE_DOMAINS    - utility domains to ignore (zoom.us, etc.)
       DOMAIN_PRIORITY   - if multiple externals, prefer these
       DOMAIN_NAME_MAP   - explicit mapping "fb.com:Meta,google.com:Google"
     """
-    INTERNAL = set([
-        d.strip().lower() for d in os.getenv(
-            "INTERNAL_DOMAINS",
-            "kempfenterprise.com,gmail.com,outlook.com,hotmail.com,yahoo.com,"
-            "icloud.com,aol.com,proton.me,protonmail.com,me.com"
-        ).split(",")
-        if d.strip()
-    ])
-    IGNORE = set([
-        d.strip().lower() for d in os.getenv(
-            "IGNORE_DOMAINS",
-            "zoom.us,meetup.com,calendar.google.com,teams.microsoft.com"
-        ).split(",")
-        if d.strip()
-    ])
-    PRIORITY = [
-        d.strip().lower() for d in os.getenv("DOMAIN_PRIORITY", "").split(",") if d.strip()
-    ]
-    NAME_MAP = {}
+    global _INTERNAL, _IGNORE, _PRIORITY, _NAME_MAP
+    _INTERNAL = frozenset(_env_domains(
+        "INTERNAL_DOMAINS",
+        "kempfenterprise.com,gmail.com,outlook.com,hotmail.com,yahoo.com,"
+        "icloud.com,aol.com,proton.me,protonmail.com,me.com"
+    ))
+    _IGNORE = frozenset(_env_domains(
+        "IGNORE_DOMAINS",
+        "zoom.us,meetup.com,calendar.google.com,teams.microsoft.com"
+    ))
+    _PRIORITY = tuple(_base_domain(p) for p in _env_domains("DOMAIN_PRIORITY"))
+    name_map = {}
     for pair in [p.strip() for p in os.getenv("DOMAIN_NAME_MAP", "").split(",") if ":" in p]:
         dom, name = pair.split(":", 1)
-        NAME_MAP[dom.strip().lower()] = name.strip()
-
-    def base_domain(d: str) -> str:
-        d = (d or "").lower().strip().replace("@", "")
-        if d.startswith("www."):
-            d = d[4:]
-        parts = d.split(".")
-        if len(parts) >= 3:
-            # heuristic: keep last two labels (works for most corporate domains)
-            d = ".".join(parts[-2:])
-        return d
-
-    def pretty_from_domain(d: str) -> str:
-        core = base_domain(d).split(".")[0]
-        return core.capitalize() if core else "Unknown"
+        name_map[dom.strip().lower()] = name.strip()
+    _NAME_MAP = MappingProxyType(name_map)
 
+reload_company_config()
+
+# Title/description fallbacks fused into one pattern: "with/for X", "POC: X", "(X)".
+# Each branch is anchored at the start and scans lazily, so branch order (not
+# position in the text) decides the winner, as the old or-chain did.
+# The parenthesised form stays case-sensitive, as it was on its own.
+_COMPANY_RE = re.compile(
+    r"(?s)^(?:"
+    r".*?(?:with|for)\s+(?P<with_for>[A-Z][A-Za-z0-9&.\- ]{2,})"
+    r"|.*?POC[:\-]\s*(?P<poc>[A-Z][A-Za-z0-9&.\- ]{2,})"
+    r"|.*?(?-i:\((?P<paren>[A-Z][A-Za-z0-9&.\- ]{2,})\))"
+    r")",
+    re.IGNORECASE,
+)
+
+def attendees_to_company(attendees, event_summary: Optional[str] = None, event_description: Optional[str] = None) -> Dict[str, str]:
+    """
+    Guess the company from attendee emails and optional event text.
+    Returns: {"companyName": str, "companyDomain": str}
+
+    Uses the domain config loaded by reload_company_config().
+    """
     # 1) Collect candidate domains from attendee emails
     domains: List[str] = []
     for a in attendees or []:
-        if isinstance(a, dict):
-            email = (a.get("email") or "").lower().strip()
-        else:
-            email = str(a).lower().strip()
+        # Exact type check: Calendar attendees are plain dicts
+        email = (a.get("email") or "") if type(a) is dict else str(a)
+        email = email.lower().strip()
         if "@" in email:
-            domains.append(base_domain(email.split("@", 1)[1]))
+            domains.append(_base_domain(email.split("@", 1)[1]))
 
     # Remove internal and utility domains
-    external = [d for d in domains if d and d not in INTERNAL and d not in IGNORE]
+    external = [d for d in domains if d and d not in _INTERNAL and d not in _IGNORE]
 
     # 2) Priority domain wins if present
-    for p in PRIORITY:
-        pb = base_domain(p)
+    for pb in _PRIORITY:
         if pb in external:
             return {
                 "companyDomain": pb,
-                "companyName": NAME_MAP.get(pb, pretty_from_domain(pb))
+                "companyName": _NAME_MAP.get(pb, _pretty_from_domain(pb))
             }
 
     # 3) Majority vote among external domains
     if external:
-        dom, _ = Counter(external).most_common(1)[0]
+        tally: Dict[str, int] = {}
+        for d in external:
+            tally[d] = tally.get(d, 0) + 1
+        # max() keeps the first-seen domain on ties, same as Counter.most_common
+        dom = max(tally, key=tally.__getitem__)
         return {
             "companyDomain": dom,
-            "companyName": NAME_MAP.get(dom, pretty_from_domain(dom))
+            "companyName": _NAME_MAP.get(dom, _pretty_from_domain(dom))
         }
 
     # 4) Fallback: any non-internal non-ignored domain at all
     for d in domains:
-        if d and d not in INTERNAL and d not in IGNORE:
-            return {"companyDomain": d, "companyName": NAME_MAP.get(d, pretty_from_domain(d))}
+        if d and d not in _INTERNAL and d not in _IGNORE:
+            return {"companyDomain": d, "companyName": _NAME_MAP.get(d, _pretty_from_domain(d))}
 
     # 5) Title/description fallback (simple heuristics)
     text = " ".join([(event_summary or ""), (event_description or "")])
-    m = re.search(r"(?:with|for)\s+([A-Z][A-Za-z0-9&.\- ]{2,})", text, flags=re.IGNORECASE) \
-        or re.search(r"POC[:\-]\s*([A-Z][A-Za-z0-9&.\- ]{2,})", text, flags=re.IGNORECASE) \
-        or re.search(r"\(([A-Z][A-Za-z0-9&.\- ]{2,})\)", text)
+    m = _COMPANY_RE.search(text)
     if m:
-        cand = m.group(1).strip()
+        cand = m.group(m.lastgroup).strip()
         if cand.lower() not in {"poc", "call", "meeting", "demo", "discovery"}:
             return {"companyDomain": "", "companyName": cand}
 
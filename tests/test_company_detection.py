@@ -0,0 +1,21 @@
+import pytest
+
+from google_helpers import attendees_to_company
+
+
+# Title fallback must keep the old "with/for" > "POC:" > "(X)" priority,
+# regardless of where each form appears in the text.
+@pytest.mark.parametrize("title, expected", [
+    ("POC: Kickoff with Acme", "Acme"),
+    ("POC: Discovery call for Globex", "Globex"),
+    ("(POC) Kickoff with Acme", "Acme"),
+    ("(Acme) POC for Initech", "Initech"),
+    ("Kickoff with Acme Corp", "Acme Corp"),
+    ("POC: Globex", "Globex"),
+    ("Sync (Initech)", "Initech"),
+    ("sync (lower)", "Unknown"),
+    ("Weekly sync", "Unknown"),
+])
+def test_company_from_title(title, expected):
+    company = attendees_to_company([], event_summary=title)
+    assert company == {"companyDomain": "", "companyName": expected}